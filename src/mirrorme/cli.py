@@ -45,6 +45,14 @@ def main(
     ),
     headless: bool = typer.Option(True, "--headless/--headed", help="Run browser headless or visible."),
     concurrency: int = typer.Option(4, "--concurrency", "-c", help="Max concurrent page fetches."),
+    asset_concurrency: int = typer.Option(
+        8, "--asset-concurrency",
+        help="Max concurrent asset requests issued per page."
+    ),
+    rewrite_workers: int = typer.Option(
+        0, "--rewrite-workers",
+        help="Processes for the final link-rewrite pass on large crawls (0 = all CPUs, 1 = serial)."
+    ),
     timeout_ms: int = typer.Option(30000, "--timeout-ms", help="Default navigation timeout per page."),
     scroll: bool = typer.Option(
         True, "--scroll/--no-scroll",
@@ -78,6 +86,8 @@ def main(
         storage_state_path=storage_state,
         headless=headless,
         concurrency=max(1, concurrency),
+        asset_concurrency=max(1, asset_concurrency),
+        rewrite_workers=max(0, rewrite_workers),
         default_timeout_ms=timeout_ms,
         scroll=scroll,
         wait_after_load_ms=wait_after_load_ms,
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
-import asyncio, os, re, pathlib, urllib.parse
+import asyncio, functools, multiprocessing, os, re, pathlib, urllib.parse
 from dataclasses import dataclass, field
 from typing import Dict, Set, Tuple, List
 import hashlib
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from selectolax.lexbor import LexborHTMLParser
 from playwright.async_api import async_playwright, BrowserContext
 
 
-_ASSET_EXTS = {
+_ASSET_EXTS = frozenset({
     ".png",".jpg",".jpeg",".webp",".avif",".gif",".svg",".ico",".bmp",".tiff",
     ".css",".js",".mjs",".map",
     ".woff",".woff2",".ttf",".otf",".eot",
     ".mp4",".webm",".ogg",".mp3",".wav",".mov",".m4a",".m4v",
     ".pdf",".txt",".xml",".json",".wasm"
-}
+})
+
+# Only the tags/attributes that can point at pages or assets are visited.
+_LINK_SELECTOR = (
+    "a[href], script[src], link[href], img[src], source[src], "
+    "video[src], audio[src], img[srcset], source[srcset]"
+)
 
 @dataclass
 class MirrorConfig:
@@ -34,6 +42,9 @@ class MirrorConfig:
     storage_state_path: str | None = None
     headless: bool = True
     concurrency: int = 4
+    asset_concurrency: int = 8             # max in-flight asset requests per page
+    rewrite_workers: int = 1               # >1 (or 0 = all CPUs) rewrites pages in a process pool;
+                                           # callers must guard their script with `if __name__ == "__main__":`
     default_timeout_ms: int = 30000
     scroll: bool = True                    # NEW: simulate user scroll for lazy loading
     wait_after_load_ms: int = 800          # NEW: extra idle wait
@@ -41,17 +52,42 @@ class MirrorConfig:
     assets_mode: str = "flat"   # flat | per-host | pages
     assets_dir: str = "assets"  # used for flat/per-host
 
+# Crawls see the same URLs over and over (nav links, shared assets), so the
+# pure-Python parse helpers are memoized.
+@functools.lru_cache(maxsize=65536)
+def _split(u: str) -> urllib.parse.SplitResult:
+    # one shared split per URL: host checks and path mapping read the cached tuple
+    return urllib.parse.urlsplit(u)
+
+@functools.lru_cache(maxsize=65536)
 def url_norm(u: str) -> str:
     return urllib.parse.urldefrag(u)[0]
 
+@functools.lru_cache(maxsize=65536)
+def _hostname(u: str) -> str | None:
+    # SplitResult.hostname re-parses netloc on every access
+    return _split(u).hostname
+
 def _is_asset(path: str) -> bool:
-    return os.path.splitext(path)[1].lower() in _ASSET_EXTS
+    # last dot-suffix of the final path segment, without splitext's tuple
+    _, dot, ext = path.rpartition(".")
+    return bool(dot) and "/" not in ext and ("." + ext.lower()) in _ASSET_EXTS
 
 def _safe_path(s: str) -> str:
     return re.sub(r"[^A-Za-z0-9._/\-]", "_", s)
 
-def to_rel_path(out_dir: pathlib.Path, url: str, cfg, start_host: str, is_html_hint: bool | None = None) -> pathlib.Path:
-    p = urllib.parse.urlparse(url)
+def _reserve_key(fp: pathlib.Path) -> str:
+    return str(fp).casefold()
+
+def to_rel_path(
+    out_dir: pathlib.Path,
+    url: str,
+    cfg,
+    start_host: str,
+    is_html_hint: bool | None = None,
+    reserved: Set[str] | None = None,
+) -> pathlib.Path:
+    p = _split(url)
     host = p.hostname or "unknown"
     path = p.path or "/"
 
@@ -81,86 +117,217 @@ def to_rel_path(out_dir: pathlib.Path, url: str, cfg, start_host: str, is_html_h
 
     else:  # flat
         target = out_dir / cfg.assets_dir / safe
-        if target.exists():
-            h = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+        # with a `reserved` set, collisions are tracked in memory instead of stat()ing disk;
+        # keys are case-folded so names differing only in case still collide, as they
+        # would on a case-insensitive filesystem (macOS default)
+        taken = (_reserve_key(target) in reserved) if reserved is not None else target.exists()
+        if taken:
+            h = hashlib.blake2b(url.encode("utf-8"), digest_size=4).hexdigest()
             base, ext2 = os.path.splitext(target.name)
             target = target.with_name(f"{base}__{h}{ext2}")
+        if reserved is not None:
+            reserved.add(_reserve_key(target))
         return target
 
 def ensure_parent(fp: pathlib.Path):
     fp.parent.mkdir(parents=True, exist_ok=True)
 
+_WRITE_CHUNK = 2 * 1024 * 1024
+_HTML_BUFFER = 128 * 1024
+
+def write_bytes_chunked(fp: pathlib.Path, data: bytes):
+    if len(data) <= _WRITE_CHUNK:
+        fp.write_bytes(data)
+        return
+    # large bodies go straight to the file in 2 MiB memoryview slices; unbuffered,
+    # so nothing is copied through an intermediate buffer
+    with open(fp, "wb", buffering=0) as f:
+        view = memoryview(data)
+        while view:
+            n = f.write(view[:_WRITE_CHUNK])
+            view = view[n:]
+
+def write_text_buffered(fp: pathlib.Path, text: str):
+    with open(fp, "w", encoding="utf-8", buffering=_HTML_BUFFER) as f:
+        f.write(text)
+
 def make_relative(from_path: pathlib.Path, to_path: pathlib.Path) -> str:
     return os.path.relpath(to_path, start=from_path.parent)
 
 CSS_IMPORT_RE = re.compile(r'@import\s+(?:url\()?["\']?([^"\')]+)["\']?\)?\s*;', re.IGNORECASE)
-
-def rewrite_urls_in_text(text: str, mapping: Dict[str, pathlib.Path], base_file: pathlib.Path, strip_csp: bool) -> str:
-    # Strip CSP meta to avoid file:// blocking
-    if strip_csp:
-        text = re.sub(
-            r'<meta[^>]+http-equiv=["\']Content-Security-Policy["\'][^>]*>',
-            '',
-            text,
-            flags=re.IGNORECASE
-        )
+# mapping keys are absolute http(s) URLs; anything else can skip the lookup
+_ABS_PREFIXES = ("http://", "https://")
+
+# srcset candidates: URL (may itself contain commas, e.g. data: URIs) plus optional descriptor
+_SRCSET_TOKEN_RE = re.compile(r'\s*([^\s,](?:\S*[^\s,])?)(?:,+|(\s+[^,]*)(?:,|$)|$)')
+
+# One alternation so a page is scanned (and copied) once instead of once per pattern.
+_REWRITE_RE = re.compile(
+    r'(?P<csp>(?i:<meta[^>]+http-equiv=["\']Content-Security-Policy["\'][^>]*>))'
+    r'|srcset="(?P<srcset>[^"]+)"'
+    r'|(?P<attr>(?:src|href)\s*=\s*)(?P<quote>"|\')(?P<url>[^"\']+)(?P=quote)'
+    r'|url\((?P<css>[^)]+)\)'
+)
+
+def rewrite_urls_in_text(
+    text: str,
+    mapping: Dict[str, pathlib.Path],
+    base_file: pathlib.Path,
+    strip_csp: bool,
+    rel_cache: Dict[Tuple[pathlib.Path, pathlib.Path], str] | None = None,
+) -> str:
+    # relpath results keyed on (page dir, target); share rel_cache across pages to reuse them
+    if rel_cache is None:
+        rel_cache = {}
+    base_dir = base_file.parent
+
+    def relative(u: str) -> str:
+        key = (base_dir, mapping[u])
+        rel = rel_cache.get(key)
+        if rel is None:
+            rel = rel_cache[key] = make_relative(base_file, mapping[u])
+        return rel
 
     # srcset
     def repl_srcset(m):
-        parts, srcset = [], m.group(1)
-        for tok in srcset.split(","):
-            tok = tok.strip()
-            if not tok:
-                continue
-            bits = tok.split()
-            u = bits[0].strip('\'"')
-            rest = " ".join(bits[1:])
-            if u in mapping:
-                rel = make_relative(base_file, mapping[u])
+        parts = []
+        for raw, desc in _SRCSET_TOKEN_RE.findall(m.group("srcset")):
+            u, rest = raw.strip('\'"'), desc.strip()
+            if u.startswith(_ABS_PREFIXES) and u in mapping:
+                rel = relative(u)
                 parts.append(f"{rel} {rest}".strip())
             else:
-                parts.append(tok)
+                parts.append(f"{raw} {rest}".strip())
         return f'srcset="{", ".join(parts)}"'
 
-    text = re.sub(r'srcset="([^"]+)"', repl_srcset, text)
-
     # src= / href=
     def sub_url(m):
-        quote, u = m.group(1), m.group(2).strip('\'"')
+        quote, u = m.group("quote"), m.group("url").strip('\'"')
+        if not u.startswith(_ABS_PREFIXES):
+            return m.group(0)
         if u in mapping:
-            rel = make_relative(base_file, mapping[u])
-            return f'{m.group(0).split("=")[0]}={quote}{rel}{quote}'
+            rel = relative(u)
+            return f'{m.group("attr").split("=")[0]}={quote}{rel}{quote}'
         return m.group(0)
 
-    text = re.sub(r'(?:src|href)\s*=\s*("|\')([^"\']+)\1', sub_url, text)
-
     # CSS url(...)
     def css_url(m):
-        u = m.group(1).strip('\'"')
+        u = m.group("css").strip('\'"')
+        if not u.startswith(_ABS_PREFIXES):
+            return m.group(0)
         if u in mapping:
-            rel = make_relative(base_file, mapping[u])
+            rel = relative(u)
             return f'url("{rel}")'
         return m.group(0)
 
-    text = re.sub(r'url\(([^)]+)\)', css_url, text)
-    return text
+    def dispatch(m):
+        kind = m.lastgroup
+        if kind == "csp":
+            # Strip CSP meta to avoid file:// blocking
+            return "" if strip_csp else m.group(0)
+        if kind == "srcset":
+            return repl_srcset(m)
+        if kind == "url":
+            return sub_url(m)
+        return css_url(m)
+
+    return _REWRITE_RE.sub(dispatch, text)
+
+def extract_links(html: str, base_url: str) -> Tuple[List[str], Set[str]]:
+    # Returns (anchors, assets). Kept in its own frame: selectolax nodes reference
+    # their parser, so the DOM is only freed once every node from tree.css() is
+    # out of scope too.
+    tree = LexborHTMLParser(html)
+    anchors: List[str] = []
+    assets: Set[str] = set()
+
+    def absolute(link: str) -> str:
+        return url_norm(urllib.parse.urljoin(base_url, link))
+
+    for node in tree.css(_LINK_SELECTOR):
+        attrs = node.attributes
+        if node.tag == "a":
+            if attrs.get("href"):
+                anchors.append(absolute(attrs["href"]))
+            continue
+        if node.tag == "link":
+            if attrs.get("href"):
+                assets.add(absolute(attrs["href"]))
+            continue
+        if attrs.get("src"):
+            assets.add(absolute(attrs["src"]))
+        ss = attrs.get("srcset")
+        if ss:
+            for src, _ in _SRCSET_TOKEN_RE.findall(ss):
+                assets.add(absolute(src))
+    return anchors, assets
+
+# Per-process state for the rewrite pool, set once by the initializer so the
+# mapping is pickled per worker rather than per page.
+_rewrite_state: Tuple[Dict[str, pathlib.Path], bool, Dict[Tuple[pathlib.Path, pathlib.Path], str]] | None = None
+
+def _init_rewrite_worker(mapping: Dict[str, pathlib.Path], strip_csp: bool):
+    global _rewrite_state
+    _rewrite_state = (mapping, strip_csp, {})
+
+def _rewrite_file(p: pathlib.Path, mapping: Dict[str, pathlib.Path], strip_csp: bool, rel_cache: Dict[Tuple[pathlib.Path, pathlib.Path], str]):
+    txt = p.read_text(encoding="utf-8", errors="ignore")
+    new_txt = rewrite_urls_in_text(txt, mapping, p, strip_csp, rel_cache)
+    if new_txt != txt:
+        p.write_text(new_txt, encoding="utf-8")
+
+def _rewrite_page(p: pathlib.Path):
+    mapping, strip_csp, rel_cache = _rewrite_state
+    _rewrite_file(p, mapping, strip_csp, rel_cache)
+
+# Spawning the pool costs ~0.2-0.5 s (each child re-imports playwright/selectolax),
+# while the serial rewrite of a ~160 KB page with ~400 asset refs is ~7.5 ms. With
+# 4 workers that only breaks even around 90 such pages, later for lighter ones.
+_REWRITE_POOL_MIN_PAGES = 256
+
+def rewrite_pages(paths: List[pathlib.Path], mapping: Dict[str, pathlib.Path], strip_csp: bool, max_workers: int = 1):
+    cpus = os.cpu_count() or 1
+    workers = min(max_workers if max_workers > 0 else cpus, cpus, len(paths))
+    if len(paths) >= _REWRITE_POOL_MIN_PAGES and workers >= 2:
+        # pages are rewritten independently, so spread the CPU-bound pass over cores;
+        # spawn rather than fork, since the parent has already started to_thread workers
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_rewrite_worker,
+                initargs=(mapping, strip_csp),
+            ) as ex:
+                list(ex.map(_rewrite_page, paths, chunksize=8))
+            return
+        except (BrokenProcessPool, RuntimeError):
+            # e.g. a caller script without an `if __name__ == "__main__":` guard can't
+            # spawn; rewriting is idempotent, so just redo everything serially
+            pass
+    rel_cache: Dict[Tuple[pathlib.Path, pathlib.Path], str] = {}
+    for p in paths:
+        _rewrite_file(p, mapping, strip_csp, rel_cache)
 
 async def run_mirror_async(cfg: MirrorConfig):
     out_dir = pathlib.Path(cfg.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     start = url_norm(cfg.start_url)
-    start_host = urllib.parse.urlparse(start).hostname
+    start_host = _hostname(start)
     allowed_hosts: Set[str] = {start_host} if start_host else set()
     allowed_hosts |= set(cfg.extra_allowed_hosts)
 
     visited_pages: Set[str] = set()
-    to_visit: List[Tuple[str, int]] = [(start, 0)]
+    # smallest depth each page has been queued at
+    queued_depth: Dict[str, int] = {start: 0}
+    to_visit: asyncio.Queue[Tuple[str, int]] = asyncio.Queue()
+    to_visit.put_nowait((start, 0))
     saved_assets: Dict[str, pathlib.Path] = {}
+    inflight_assets: Set[str] = set()
+    requested_assets: Set[str] = set()
+    reserved_paths: Set[str] = set()
     page_html_paths: Dict[str, pathlib.Path] = {}
 
-    sem = asyncio.Semaphore(max(1, cfg.concurrency))
-
     async with async_playwright() as pw:
         browser = await pw.chromium.launch(headless=cfg.headless, args=["--disable-web-security"])
         context_kwargs = {"user_agent": cfg.user_agent}
@@ -173,7 +340,7 @@ async def run_mirror_async(cfg: MirrorConfig):
         async def handle_response(res):
             try:
                 url = url_norm(res.url)
-                host = urllib.parse.urlparse(url).hostname or ""
+                host = _hostname(url) or ""
                 status = res.status
                 if status != 200:
                     return
@@ -182,162 +349,177 @@ async def run_mirror_async(cfg: MirrorConfig):
                 if "text/html" in (ct or ""):
                     return
                 if (host in allowed_hosts) or cfg.all_host_assets:
-                    path = to_rel_path(out_dir, url, cfg, start_host, is_html_hint=False)
-                    if url not in saved_assets:
+                    # claim the URL before awaiting so duplicate responses skip it
+                    if url in saved_assets or url in inflight_assets:
+                        return
+                    inflight_assets.add(url)
+                    path = None
+                    try:
                         body = await res.body()
+                        # reserve the name only once there is a body to put under it
+                        path = to_rel_path(out_dir, url, cfg, start_host, is_html_hint=False, reserved=reserved_paths)
                         ensure_parent(path)
-                        with open(path, "wb") as f:
-                            f.write(body)
+                        # keep the loop free for other responses while the file is written
+                        await asyncio.to_thread(write_bytes_chunked, path, body)
                         saved_assets[url] = path
+                    finally:
+                        inflight_assets.discard(url)
+                        if path is not None and url not in saved_assets:
+                            reserved_paths.discard(_reserve_key(path))
             except Exception:
                 pass
 
         context.on("response", handle_response)
 
-        async def fetch_page(url: str, depth: int):
+        async def fetch_page(page, url: str, depth: int):
             url_n = url_norm(url)
             if url_n in visited_pages or depth > cfg.max_depth:
                 return
+            # a shallower entry for this URL is still queued; let that one crawl it
+            if depth > queued_depth.get(url_n, depth):
+                return
             visited_pages.add(url_n)
 
-            page = await context.new_page()
-            await page.set_extra_http_headers({"Accept-Language": "en-US,en;q=0.9"})
-            try:
-                resp = await page.goto(url_n, wait_until="networkidle")
-                if not resp or resp.status != 200:
-                    await page.close()
-                    return
+            resp = await page.goto(url_n, wait_until="networkidle")
+            if not resp or resp.status != 200:
+                return
 
-                # lazy-load triggers
-                if cfg.scroll:
-                    # scroll to bottom in steps
-                    await page.evaluate("""
-                        (async () => {
-                          const delay = ms => new Promise(r => setTimeout(r, ms));
-                          let last = 0;
-                          for (let i=0;i<10;i++){
-                            window.scrollTo(0, document.body.scrollHeight);
-                            await delay(150);
-                            const h = document.body.scrollHeight;
-                            if (h === last) break;
-                            last = h;
-                          }
-                          window.scrollTo(0, 0);
-                        })();
-                    """)
-                if cfg.wait_after_load_ms > 0:
-                    await page.wait_for_timeout(cfg.wait_after_load_ms)
-
-                html = await page.content()
-                html_path = to_rel_path(out_dir, url_n, cfg, start_host, is_html_hint=True)
-                ensure_parent(html_path)
-                with open(html_path, "w", encoding="utf-8") as f:
-                    f.write(html)
-                page_html_paths[url_n] = html_path
-
-                soup = BeautifulSoup(html, "html.parser")
-
-                def extract_links(attrs):
-                    for tag, attr in attrs:
-                        for el in soup.find_all(tag):
-                            link = el.get(attr)
-                            if not link:
-                                continue
-                            absu = urllib.parse.urljoin(url_n, link)
-                            yield url_norm(absu)
-
-                anchors = list(extract_links([("a","href")]))
-                scripts = list(extract_links([("script","src")]))
-                links   = list(extract_links([("link","href")]))
-                imgs    = list(extract_links([("img","src")]))
-                media   = list(extract_links([("source","src"), ("video","src"), ("audio","src")]))
-                # srcset
-                srcset_urls = []
-                for el in soup.find_all(["img","source"]):
-                    ss = el.get("srcset")
-                    if ss:
-                        for token in ss.split(","):
-                            token = token.strip()
-                            if token:
-                                src = token.split()[0]
-                                absu = urllib.parse.urljoin(url_n, src)
-                                srcset_urls.append(url_norm(absu))
-
-                # queue same-host pages only
+            # lazy-load triggers
+            if cfg.scroll:
+                # scroll to bottom in steps
+                await page.evaluate("""
+                    (async () => {
+                      const delay = ms => new Promise(r => setTimeout(r, ms));
+                      let last = 0;
+                      for (let i=0;i<10;i++){
+                        window.scrollTo(0, document.body.scrollHeight);
+                        await delay(150);
+                        const h = document.body.scrollHeight;
+                        if (h === last) break;
+                        last = h;
+                      }
+                      window.scrollTo(0, 0);
+                    })();
+                """)
+            if cfg.wait_after_load_ms > 0:
+                await page.wait_for_timeout(cfg.wait_after_load_ms)
+
+            html = await page.content()
+            html_path = to_rel_path(out_dir, url_n, cfg, start_host, is_html_hint=True)
+            ensure_parent(html_path)
+            await asyncio.to_thread(write_text_buffered, html_path, html)
+            page_html_paths[url_n] = html_path
+
+            anchors, assets = extract_links(html, url_n)
+
+            # only the URL lists are needed from here on; release the page text
+            # before the network waits below so concurrent pages don't each hold
+            # a full copy (the DOM is already gone with extract_links' frame)
+            del html
+
+            # queue same-host pages only, and only within the depth limit; a page
+            # already queued is queued again if this path to it is shorter
+            next_depth = depth + 1
+            if next_depth <= cfg.max_depth:
                 for a in anchors:
-                    host = urllib.parse.urlparse(a).hostname
-                    if host and host == start_host:
-                        to_visit.append((a, depth + 1))
-
-                # trigger asset fetches (any host if all_host_assets=True)
-                assets = set(scripts + links + imgs + media + srcset_urls)
-                for asset_url in assets:
-                    host = urllib.parse.urlparse(asset_url).hostname or ""
-                    if cfg.all_host_assets or host in allowed_hosts:
-                        await context.request.get(asset_url)
-
+                    host = _hostname(a)
+                    if not host or host != start_host or a in visited_pages:
+                        continue
+                    if next_depth < queued_depth.get(a, next_depth + 1):
+                        queued_depth[a] = next_depth
+                        to_visit.put_nowait((a, next_depth))
+
+            # trigger asset fetches (any host if all_host_assets=True)
+            asset_sem = asyncio.Semaphore(max(1, cfg.asset_concurrency))
+
+            async def _fetch_asset(asset_url: str):
+                async with asset_sem:
+                    await context.request.get(asset_url)
+
+            # request each asset once per crawl, not once per referencing page
+            pending: List[str] = []
+            for asset_url in assets:
+                if asset_url in requested_assets or asset_url in saved_assets:
+                    continue
+                host = _hostname(asset_url) or ""
+                if cfg.all_host_assets or host in allowed_hosts:
+                    requested_assets.add(asset_url)
+                    pending.append(asset_url)
+
+            await asyncio.gather(*(_fetch_asset(u) for u in pending), return_exceptions=True)
+
+        # Persistent workers pull from the queue as soon as they are free, so one
+        # slow page doesn't hold back the rest of a batch. Each worker reuses one
+        # tab, parked on about:blank between URLs to drop the previous JS state.
+        async def worker():
+            page = None
+            try:
+                while True:
+                    u, d = await to_visit.get()
+                    try:
+                        # the tab is opened inside the per-item try: if that fails the
+                        # item is still marked done and join() can't hang
+                        if page is None or page.is_closed():
+                            page = await context.new_page()
+                            await page.set_extra_http_headers({"Accept-Language": "en-US,en;q=0.9"})
+                        await fetch_page(page, u, d)
+                        if page.url != "about:blank":
+                            await page.goto("about:blank")
+                    except Exception:
+                        pass  # a failed page shouldn't take its worker down
+                    finally:
+                        to_visit.task_done()
             finally:
-                await page.close()
-
-        # Process queue in batches
-        while to_visit:
-            batch: List[Tuple[str,int]] = []
-            while to_visit and len(batch) < cfg.concurrency:
-                u,d = to_visit.pop(0)
-                if u not in visited_pages:
-                    batch.append((u,d))
-            if not batch:
-                break
-            async def _task(u,d):
-                async with sem:
-                    await fetch_page(u,d)
-            await asyncio.gather(*(_task(u,d) for (u,d) in batch))
-
-        # Build mapping and rewrite HTML (also handle CSS @import)
-        mapping = {u: p for (u, p) in saved_assets.items()}
-        for u, p in page_html_paths.items():
-            mapping[u] = p
-
-        # Optionally follow CSS @import inside saved stylesheets
-        if cfg.inline_css_imports:
-            css_files = [p for p in saved_assets.values() if p.suffix.lower() in (".css",)]
-            for css_path in css_files:
-                try:
-                    text = css_path.read_text(encoding="utf-8", errors="ignore")
-                    imports = CSS_IMPORT_RE.findall(text)
-                    changed = False
-                    for u in imports:
-                        absu = urllib.parse.urljoin("file:///"+str(css_path), u)
-                        # turn file-based absolute into proper web absolute if needed
-                        if not (u.startswith("http://") or u.startswith("https://")):
-                            # try to resolve relative to original host path; skip if unknown
-                            continue
-                        if (cfg.all_host_assets or urllib.parse.urlparse(absu).hostname in allowed_hosts) and (u not in mapping):
-                            # fetch and save
-                            # NOTE: we don't have original referer; rely on prior capture or skip
-                            pass
-                    # (We keep CSS as-is; Playwright's response handler will have captured imported CSS if requested by page)
-                except Exception:
-                    pass  # non-fatal
-
-        for u, p in page_html_paths.items():
-            txt = p.read_text(encoding="utf-8", errors="ignore")
-            new_txt = rewrite_urls_in_text(txt, mapping, p, cfg.strip_csp)
-            if new_txt != txt:
-                p.write_text(new_txt, encoding="utf-8")
-
-        # Simple index
-        index_path = pathlib.Path(cfg.out_dir) / "index.html"
-        ensure_parent(index_path)
-        with open(index_path, "w", encoding="utf-8") as f:
-            f.write("<h1>Local Mirror</h1><ul>\n")
-            for u, p in sorted(page_html_paths.items()):
-                rel = os.path.relpath(p, start=out_dir)
-                f.write(f'<li><a href="{rel}">{u}</a></li>\n')
-            f.write("</ul>\n")
+                if page is not None and not page.is_closed():
+                    await page.close()
 
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, cfg.concurrency))]
+        await to_visit.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # the crawl is over; close the browser before the CPU-bound post-processing
         await browser.close()
 
+    # Build mapping and rewrite HTML (also handle CSS @import)
+    mapping = {u: p for (u, p) in saved_assets.items()}
+    for u, p in page_html_paths.items():
+        mapping[u] = p
+
+    # Optionally follow CSS @import inside saved stylesheets
+    if cfg.inline_css_imports:
+        css_files = [p for p in saved_assets.values() if p.suffix.lower() in (".css",)]
+        for css_path in css_files:
+            try:
+                text = css_path.read_text(encoding="utf-8", errors="ignore")
+                imports = CSS_IMPORT_RE.findall(text)
+                changed = False
+                for u in imports:
+                    absu = urllib.parse.urljoin("file:///"+str(css_path), u)
+                    # turn file-based absolute into proper web absolute if needed
+                    if not (u.startswith("http://") or u.startswith("https://")):
+                        # try to resolve relative to original host path; skip if unknown
+                        continue
+                    if (cfg.all_host_assets or _hostname(absu) in allowed_hosts) and (u not in mapping):
+                        # fetch and save
+                        # NOTE: we don't have original referer; rely on prior capture or skip
+                        pass
+                # (We keep CSS as-is; Playwright's response handler will have captured imported CSS if requested by page)
+            except Exception:
+                pass  # non-fatal
+
+    rewrite_pages(list(page_html_paths.values()), mapping, cfg.strip_csp, cfg.rewrite_workers)
+
+    # Simple index
+    index_path = pathlib.Path(cfg.out_dir) / "index.html"
+    ensure_parent(index_path)
+    lines = ["<h1>Local Mirror</h1><ul>\n"]
+    for u, p in sorted(page_html_paths.items()):
+        rel = os.path.relpath(p, start=out_dir)
+        lines.append(f'<li><a href="{rel}">{u}</a></li>\n')
+    lines.append("</ul>\n")
+    index_path.write_text("".join(lines), encoding="utf-8")
+
 def run_mirror(cfg: MirrorConfig):
     asyncio.run(run_mirror_async(cfg))
 